@@ -2,88 +2,196 @@ import subprocess
 import json
 import sys
 import os
+import atexit
+import logging
+import threading
 
-def call_analyze_pr_tool(pr_diff_text: str):
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Most recent server stderr kept for error reports
+_STDERR_LIMIT = 1 << 20
+
+# Directory holding main.py, config.py and tools/; the server runs with it as
+# its script directory, so its modules import each other as top-level modules
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SERVER_SCRIPT = os.path.join(_APP_DIR, "main.py")
+
+
+class _MCPClient:
     """
-    Calls the MCP server over STDIO with the analyze_pr_tool.
+    Long-lived STDIO connection to the MCP server.
+
+    The server process is spawned and initialized once; subsequent tool calls
+    reuse the same pipes instead of paying interpreter startup and the
+    initialize handshake on every request.
     """
-    # Get the correct path to main.py
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    main_py_path = os.path.join(current_dir, "main.py")
-    
-    # Start the MCP server as a subprocess
-    proc = subprocess.Popen(
-        [sys.executable, main_py_path],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        bufsize=0  # Unbuffered
-    )
 
-    try:
-        # Initialize the MCP connection
-        init_request = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "initialize",
-            "params": {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {},
-                "clientInfo": {
-                    "name": "test-client",
-                    "version": "1.0.0"
-                }
-            }
-        }
+    def __init__(self, server_args):
+        self.server_args = server_args
+        self.lock = threading.Lock()
+        self._next_id = 1
+        self.calls = 0
 
-        # Send initialize request
-        proc.stdin.write(json.dumps(init_request) + "\n")
-        proc.stdin.flush()
+        # Start the MCP server as a subprocess
+        self.proc = subprocess.Popen(
+            server_args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            # Binary, block-buffered pipes: orjson works on bytes and every
+            # message is flushed explicitly
+            bufsize=-1,
+            # Large pipe so big diffs don't stall on a full kernel buffer
+            pipesize=1 << 20
+        )
 
-        # Read initialize response
-        init_response_line = proc.stdout.readline()
-        if not init_response_line:
-            stderr_output = proc.stderr.read()
-            raise RuntimeError(f"No initialize response from MCP server. Stderr: {stderr_output}")
-        
-        init_response = json.loads(init_response_line)
+        # Drain stderr continuously so a chatty server never blocks on a
+        # full pipe while we wait on stdout
+        self._stderr_tail = bytearray()
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+
+        try:
+            self._initialize()
+        except Exception:
+            self.close()
+            raise
+
+    def _initialize(self):
+        # Initialize the MCP connection
+        init_response = self._request("initialize", {
+            "protocolVersion": "2024-11-05",
+            "capabilities": {},
+            "clientInfo": {
+                "name": "test-client",
+                "version": "1.0.0"
+            }
+        })
         if "error" in init_response:
             raise RuntimeError(f"Initialize error: {init_response['error']}")
 
-        # Send initialized notification
-        initialized_notification = {
+        # Send initialized notification; it stays buffered and goes out
+        # in the same write as the first tool call
+        self._send({
             "jsonrpc": "2.0",
             "method": "notifications/initialized"
-        }
-        proc.stdin.write(json.dumps(initialized_notification) + "\n")
-        proc.stdin.flush()
+        }, flush=False)
+
+    def _drain_stderr(self):
+        for line in iter(self.proc.stderr.readline, b""):
+            self._stderr_tail += line
+            if len(self._stderr_tail) > _STDERR_LIMIT:
+                del self._stderr_tail[:-_STDERR_LIMIT]
+
+    def stderr_output(self, timeout: float = 1.0) -> str:
+        """Return the captured stderr tail, waiting briefly for a dead server to flush."""
+        if not self.alive():
+            self._stderr_thread.join(timeout)
+        return bytes(self._stderr_tail).decode(errors="replace")
+
+    def _send(self, message: dict, flush: bool = True):
+        # Serialize with the trailing newline in one buffer: a single write
+        # per message and no extra copy of large diffs
+        self.proc.stdin.write(orjson.dumps(message, option=orjson.OPT_APPEND_NEWLINE))
+        if flush:
+            self.proc.stdin.flush()
+
+    def _request(self, method: str, params: dict) -> dict:
+        request_id = self._next_id
+        self._next_id += 1
 
-        # Construct the MCP tool call request
-        request = {
+        self._send({
             "jsonrpc": "2.0",
-            "id": 2,
-            "method": "tools/call",
-            "params": {
-                "name": "analyze_pr_tool",
-                "arguments": {
-                    "pr_diff_text": pr_diff_text
-                }
-            }
-        }
+            "id": request_id,
+            "method": method,
+            "params": params
+        })
 
-        # Send tool call request
-        proc.stdin.write(json.dumps(request) + "\n")
-        proc.stdin.flush()
+        # Skip any server notifications until our response arrives
+        while True:
+            response_line = self.proc.stdout.readline()
+            if not response_line:
+                stderr_output = self.stderr_output()
+                raise RuntimeError(f"No {method} response from MCP server. Stderr: {stderr_output}")
 
-        # Read response
-        response_line = proc.stdout.readline()
-        if not response_line:
-            stderr_output = proc.stderr.read()
-            raise RuntimeError(f"No tool response from MCP server. Stderr: {stderr_output}")
+            response = orjson.loads(response_line)
+            if response.get("id") == request_id:
+                return response
+
+    def call_tool(self, name: str, arguments: dict) -> dict:
+        with self.lock:
+            self.calls += 1
+            logger.debug(f"Reusing MCP server pid={self.proc.pid} (call #{self.calls})")
+            return self._request("tools/call", {
+                "name": name,
+                "arguments": arguments
+            })
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def close(self):
+        if self.alive():
+            self.proc.terminate()
+        self.proc.wait()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _get_client() -> _MCPClient:
+    """Return the shared MCP client, (re)starting the server if needed."""
+    global _client
+    with _client_lock:
+        if _client is None or not _client.alive():
+            if _client is not None:
+                _client.close()  # reap the dead server
+            _client = _MCPClient([sys.executable, _SERVER_SCRIPT])
+        return _client
+
+
+def _reset_client():
+    """Drop the shared client so the next call spawns a fresh server."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+# One hook for whichever server is current, however often it was restarted
+atexit.register(_reset_client)
+
+
+def call_analyze_pr_tool_inproc(pr_diff_text: str):
+    """
+    Calls analyze_pr directly in this process, skipping the MCP transport.
+    """
+    # Same import layout as the server, also when loaded as app.agent
+    if _APP_DIR not in sys.path:
+        sys.path.insert(0, _APP_DIR)
+    from tools.analyse_pr import analyze_pr
+
+    return {"result": analyze_pr(pr_diff_text).dict()}
+
+
+def call_analyze_pr_tool_stdio(pr_diff_text: str):
+    """
+    Calls the MCP server over STDIO with the analyze_pr_tool.
+
+    The server subprocess is started lazily on first use and kept alive
+    across calls.
+    """
+    client = _get_client()
+
+    try:
+        response = client.call_tool("analyze_pr_tool", {
+            "pr_diff_text": pr_diff_text
+        })
 
-        response = json.loads(response_line)
-        
         # Extract the actual result from MCP response format
         if "result" in response and "content" in response["result"]:
             content = response["result"]["content"]
@@ -91,23 +199,30 @@ def call_analyze_pr_tool(pr_diff_text: str):
                 # If the text is JSON string, parse it
                 text_content = content[0]["text"]
                 try:
-                    parsed_result = json.loads(text_content)
+                    parsed_result = orjson.loads(text_content)
                     return {"result": parsed_result}
-                except json.JSONDecodeError:
+                except orjson.JSONDecodeError:
                     return {"result": text_content}
         
         return response
 
     except Exception as e:
-        # Read any error output
-        stderr_output = proc.stderr.read()
         print(f"Error: {e}")
-        if stderr_output:
-            print(f"Server stderr: {stderr_output}")
+        # The connection is in an unknown state; start over next time
+        _reset_client()
         raise
-    finally:
-        proc.terminate()
-        proc.wait()
+
+
+def call_analyze_pr_tool(pr_diff_text: str):
+    """
+    Runs analyze_pr_tool using the transport selected by MCP_TRANSPORT.
+
+    "inproc" (default) calls the analyzer directly; "stdio" goes through a
+    real MCP server subprocess.
+    """
+    if os.environ.get("MCP_TRANSPORT", "inproc") == "inproc":
+        return call_analyze_pr_tool_inproc(pr_diff_text)
+    return call_analyze_pr_tool_stdio(pr_diff_text)
 
 if __name__ == "__main__":
     # Example PR diff
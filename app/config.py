@@ -1,71 +1,150 @@
 import os
 import json
-from dataclasses import dataclass
-from typing import List, Dict, Optional
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Tuple, Mapping, Optional, Pattern, Literal
 import logging
 
+try:
+    import ahocorasick  # optional: pyahocorasick, for large keyword sets
+except ImportError:
+    ahocorasick = None
+
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Keyword count from which the Aho-Corasick automaton replaces the regex
+_AUTOMATON_MIN_KEYWORDS = 32
+
+# Shared read-only defaults; frozen configs can reference them without copying
+_DEFAULT_MODELS = ("llama3.2:3b", "qwen2.5-coder:1.5b", "tinyllama")
+
+_DEFAULT_RISK_KEYWORDS = MappingProxyType({
+    "TODO": 0.2,
+    "FIXME": 0.3,
+    "HACK": 0.4,
+    "XXX": 0.3,
+    "password": 0.6,
+    "secret": 0.6,
+    "api_key": 0.6,
+    "token": 0.4,
+    "eval(": 0.7,
+    "exec(": 0.7,
+    "os.system": 0.8,
+    "subprocess": 0.4,
+    "shell=True": 0.6
+})
+
+_DEFAULT_FILE_TYPE_WEIGHTS = MappingProxyType({
+    ".py": 1.0,
+    ".js": 1.0,
+    ".ts": 1.0,
+    ".java": 1.0,
+    ".cpp": 1.0,
+    ".sql": 1.3,
+    ".sh": 1.3,
+    ".yml": 0.8,
+    ".yaml": 0.8,
+    ".json": 0.8,
+    ".md": 0.5,
+    ".txt": 0.5
+})
+
+def _frozen_mapping(value, default):
+    """Return value as a read-only mapping, falling back to default when unset"""
+    if value is None:
+        return default
+    if isinstance(value, MappingProxyType):
+        return value
+    return MappingProxyType(dict(value))
+
+@dataclass(frozen=True, slots=True)
 class OllamaConfig:
     """Configuration for Ollama LLM integration"""
     base_url: str = "http://localhost:11434"
-    models: List[str] = None
+    models: Tuple[str, ...] = _DEFAULT_MODELS
     timeout: int = 20
     temperature: float = 0.2
     top_p: float = 0.8
     max_tokens: int = 120
+    # How long Ollama keeps the model loaded after a request
+    keep_alive: str = "10m"
+    # Cap on diff characters embedded in the prompt
+    prompt_diff_chars: int = 8000
+    # Skip a model for breaker_cooldown seconds after this many consecutive
+    # connection failures
+    breaker_threshold: int = 3
+    breaker_cooldown: float = 60.0
+    # Extra attempts per model on transient HTTP statuses (408/429/5xx)
+    retries: int = 2
+    # Query all models concurrently and take the first answer instead of
+    # trying them in order; costs more Ollama compute
+    race_models: bool = False
     
     def __post_init__(self):
-        if self.models is None:
-            self.models = ["llama3.2:3b", "qwen2.5-coder:1.5b", "tinyllama"]
+        # Lists loaded from JSON are stored as tuples to keep the config immutable
+        models = _DEFAULT_MODELS if self.models is None else tuple(self.models)
+        object.__setattr__(self, "models", models)
+        if self.retries < 0:
+            raise ValueError(f"ollama.retries must be >= 0, got {self.retries}")
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class AnalysisConfig:
     """Configuration for PR analysis rules"""
     max_diff_size: int = 50000
-    risk_keywords: Dict[str, float] = None
-    file_type_weights: Dict[str, float] = None
+    # Read-only mappings are unhashable, so they are left out of the hash
+    # (still compared for equality); the config stays usable as a cache key
+    risk_keywords: Mapping[str, float] = field(default_factory=lambda: _DEFAULT_RISK_KEYWORDS, hash=False)
+    file_type_weights: Mapping[str, float] = field(default_factory=lambda: _DEFAULT_FILE_TYPE_WEIGHTS, hash=False)
+    # PRs scoring below this with no notable issues skip the LLM review
+    llm_skip_threshold: float = 0.2
+    # Case-insensitive alternation of all risk keywords, built once at load time
+    keyword_pattern: Optional[Pattern] = field(default=None, init=False, repr=False, compare=False)
+    # Automaton over lowercased keywords (value = match length), when pyahocorasick
+    # is installed and the keyword set is large enough to benefit
+    keyword_automaton: Optional[object] = field(default=None, init=False, repr=False, compare=False)
     
     def __post_init__(self):
-        if self.risk_keywords is None:
-            self.risk_keywords = {
-                "TODO": 0.2,
-                "FIXME": 0.3,
-                "HACK": 0.4,
-                "XXX": 0.3,
-                "password": 0.6,
-                "secret": 0.6,
-                "api_key": 0.6,
-                "token": 0.4,
-                "eval(": 0.7,
-                "exec(": 0.7,
-                "os.system": 0.8,
-                "subprocess": 0.4,
-                "shell=True": 0.6
-            }
-        
-        if self.file_type_weights is None:
-            self.file_type_weights = {
-                ".py": 1.0,
-                ".js": 1.0,
-                ".ts": 1.0,
-                ".java": 1.0,
-                ".cpp": 1.0,
-                ".sql": 1.3,
-                ".sh": 1.3,
-                ".yml": 0.8,
-                ".yaml": 0.8,
-                ".json": 0.8,
-                ".md": 0.5,
-                ".txt": 0.5
-            }
+        risk_keywords = _frozen_mapping(self.risk_keywords, _DEFAULT_RISK_KEYWORDS)
+        object.__setattr__(self, "risk_keywords", risk_keywords)
+        object.__setattr__(self, "file_type_weights",
+                           _frozen_mapping(self.file_type_weights, _DEFAULT_FILE_TYPE_WEIGHTS))
+        object.__setattr__(self, "keyword_pattern", re.compile(
+            "|".join(map(re.escape, risk_keywords)), re.IGNORECASE
+        ))
+        object.__setattr__(self, "keyword_automaton", _build_automaton(risk_keywords))
 
-@dataclass
+def _build_automaton(keywords: Mapping[str, float]):
+    """Build a single-pass multi-keyword matcher, or None to use the regex"""
+    if ahocorasick is None or len(keywords) < _AUTOMATON_MIN_KEYWORDS or "" in keywords:
+        return None
+    automaton = ahocorasick.Automaton()
+    for keyword in keywords:
+        keyword_lower = keyword.lower()
+        automaton.add_word(keyword_lower, len(keyword_lower))
+    automaton.make_automaton()
+    return automaton
+
+@dataclass(frozen=True, slots=True)
+class CacheConfig:
+    """Configuration for the LLM response cache"""
+    max_entries: int = 512
+    # Seconds before a cached review expires; None keeps entries until evicted
+    ttl_secs: Optional[float] = None
+
+@dataclass(frozen=True, slots=True)
 class PRAnalyzerConfig:
     """Main configuration class"""
     ollama: OllamaConfig
     analysis: AnalysisConfig
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    # Which backend writes the human-readable review; "none" skips the LLM
+    summarizer: Literal["ollama", "none"] = "ollama"
+    
+    def __post_init__(self):
+        if self.summarizer not in ("ollama", "none"):
+            raise ValueError(f"Unknown summarizer: {self.summarizer}")
     
     @classmethod
     def from_file(cls, config_path: str = "config.json") -> "PRAnalyzerConfig":
@@ -83,7 +162,9 @@ class PRAnalyzerConfig:
                 
                 return cls(
                     ollama=OllamaConfig(**config_data.get("ollama", {})),
-                    analysis=AnalysisConfig(**config_data.get("analysis", {}))
+                    analysis=AnalysisConfig(**config_data.get("analysis", {})),
+                    cache=CacheConfig(**config_data.get("cache", {})),
+                    summarizer=config_data.get("summarizer", "ollama")
                 )
             else:
                 logger.info(f"No config file found at {config_path}, using defaults")
@@ -98,15 +179,11 @@ class PRAnalyzerConfig:
         """Create default configuration"""
         return cls(
             ollama=OllamaConfig(),
-            analysis=AnalysisConfig()
+            analysis=AnalysisConfig(),
+            cache=CacheConfig()
         )
 
-# Global config instance
-_config: Optional[PRAnalyzerConfig] = None
-
+@lru_cache(maxsize=1)
 def get_config() -> PRAnalyzerConfig:
     """Get the global configuration instance"""
-    global _config
-    if _config is None:
-        _config = PRAnalyzerConfig.from_file()
-    return _config
\ No newline at end of file
+    return PRAnalyzerConfig.from_file()
\ No newline at end of file
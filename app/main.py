@@ -1,17 +1,32 @@
+import asyncio
+import atexit
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from mcp.server.fastmcp import FastMCP
-from tools.analyse_pr import AnalyzePRInput, AnalyzePROutput, analyze_pr
+from config import get_config
+from tools.analyse_pr import AnalyzePRInput, AnalyzePROutput, analyze_pr, warm_up_llm, close_session
 
 # Initialize the MCP server
 mcp = FastMCP("pr_analyzer_mcp")
 
+# Bounded pool for blocking analyses; caps concurrent LLM requests per server
+_EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="analyze_pr")
+
 # Define the tool
 @mcp.tool()
-def analyze_pr_tool(pr_diff_text: str):
+async def analyze_pr_tool(pr_diff_text: str):
     """Analyze PR diff text and return structured output."""
-    result = analyze_pr(pr_diff_text)
+    # analyze_pr blocks on the LLM; keep the event loop free for other calls
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(_EXECUTOR, analyze_pr, pr_diff_text)
     # Return the dataclass directly, FastMCP will handle serialization
     return result
 
 # Run the server over STDIO for local testing
 if __name__ == "__main__":
+    # Load the LLM in the background so the first request hits a warm model
+    if os.environ.get("MCP_NO_WARMUP") != "1" and get_config().summarizer == "ollama":
+        threading.Thread(target=warm_up_llm, daemon=True).start()
+    atexit.register(close_session)
     mcp.run(transport="stdio")
\ No newline at end of file
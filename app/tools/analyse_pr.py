@@ -1,11 +1,16 @@
 from dataclasses import dataclass, asdict
 from typing import List, Dict, Optional
 import requests
-import json
+import orjson
+import hashlib
 import logging
+import math
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from collections import OrderedDict
 from datetime import datetime
-from pathlib import Path
 
 # Import config system
 from config import get_config
@@ -14,6 +19,75 @@ from config import get_config
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Meta-commentary stripped from LLM output by clean_ai_response
+_AI_PREFIX_RE = re.compile(
+    r"^(?:(?:Here is a concise professional code review:"
+    r"|Here's a concise professional code review:"
+    r"|Here is a professional assessment:"
+    r"|Here's my code review:"
+    r"|Based on the PR diff:"
+    r"|Looking at this PR:)\s*)+"
+)
+_AI_ENDING_RE = re.compile(
+    r"(?:Note:.*|Overall.*recommendation.*|I've kept.*concise.*)$",
+    re.IGNORECASE | re.MULTILINE
+)
+_WHITESPACE_RE = re.compile(r'\s+')
+_DOUBLE_DOT_RE = re.compile(r'\.\s*\.')
+
+# Shared HTTP session so Ollama calls reuse keep-alive connections across
+# models and analyses; retries are handled by the model fallback loop
+_SESSION = requests.Session()
+_SESSION.mount("http://", requests.adapters.HTTPAdapter(
+    pool_connections=4, pool_maxsize=8, max_retries=0
+))
+
+# Content-addressed LRU cache of successful LLM reviews:
+# key -> (summary, metadata, stored_at)
+_llm_cache: "OrderedDict[str, tuple[str, dict, float]]" = OrderedDict()
+_llm_cache_lock = threading.Lock()
+_llm_cache_stats = {"hits": 0, "misses": 0}
+
+# Static parts of the review prompt; only the PR-specific pieces are built per call
+_PROMPT_HEADER = (
+    "You are a senior software engineer conducting a code review. "
+    "Analyze this PR and provide a professional assessment.\n"
+    "\n"
+    "Files Changed: "
+)
+_PROMPT_FOOTER = (
+    "\n"
+    "\n"
+    "Provide a concise professional code review (2-3 sentences) covering:\n"
+    "1. What functionality was added/changed\n"
+    "2. Any security, performance, or code quality concerns\n"
+    "3. Overall recommendation\n"
+    "\n"
+    "Be direct and actionable. Focus on what matters to developers."
+)
+
+# Lines worth showing the LLM: added/removed lines plus file and hunk headers
+_EXCERPT_LINE_RE = re.compile(r'^(?:[+-]|@@|diff ).*$', re.MULTILINE)
+
+# Statuses worth retrying on the same model (e.g. while Ollama loads it)
+_RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+# Per-model circuit breaker: model -> (consecutive connection failures, opened_at)
+_breaker: Dict[str, tuple[int, float]] = {}
+_breaker_lock = threading.Lock()
+
+# Matches every "diff --git" file header, capturing the path pair (trailing
+# whitespace and CR excluded); _header_path picks the file name out of it
+_DIFF_HEADER_RE = re.compile(r'^diff --git (.*\S)', re.MULTILINE)
+
+@dataclass(frozen=True, slots=True)
+class Issue:
+    file: str
+    issue: str
+    line_preview: str = ""
+    risk_weight: float = 0.0
+    keyword: Optional[str] = None
+
 @dataclass
 class AnalyzePRInput:
     pr_diff_text: str
@@ -23,7 +97,7 @@ class AnalyzePROutput:
     summary: str
     risk_score: float
     files_changed: List[str]
-    notable_issues: List[Dict]
+    notable_issues: List[Issue]
     suggested_tests: List[str]
     suggested_labels: List[str]
     human_readable_review: str
@@ -34,136 +108,387 @@ class AnalyzePROutput:
 
 def validate_pr_input(pr_diff_text: str) -> tuple[bool, str]:
     """Validate PR input before processing"""
-    config = get_config()
+    max_diff_size = get_config().analysis.max_diff_size
     
+    # Cheapest checks first; none of them copy the input
     if not pr_diff_text:
         return False, "PR diff text is empty"
     
-    if not pr_diff_text.strip():
-        return False, "PR diff text contains only whitespace"
+    diff_size = len(pr_diff_text)
+    if diff_size > max_diff_size:
+        return False, f"PR diff too large ({diff_size} chars). Maximum {max_diff_size} characters."
     
-    if len(pr_diff_text) > config.analysis.max_diff_size:
-        return False, f"PR diff too large ({len(pr_diff_text)} chars). Maximum {config.analysis.max_diff_size} characters."
+    if pr_diff_text.isspace():
+        return False, "PR diff text contains only whitespace"
     
     if "diff --git" not in pr_diff_text:
         return False, "Invalid PR diff format - missing 'diff --git' header"
     
     return True, "Valid input"
 
-def calculate_risk_score(files_changed: List[str], notable_issues: List[Dict]) -> float:
+def _first_keyword(line: str, keywords: Dict[str, float]) -> Optional[tuple[str, float]]:
+    """Return the first configured keyword (in config order) found in the line"""
+    line_lower = line.lower()
+    for keyword, weight in keywords.items():
+        if keyword.lower() in line_lower:
+            return keyword, weight
+    return None
+
+def _keyword_hits(text: str, pos: int, analysis_config):
+    """Yield (start, end) spans of risk keyword matches in text, in order, from pos"""
+    automaton = analysis_config.keyword_automaton
+    if automaton is not None:
+        lowered = text.lower()
+        # Offsets only carry over when lowercasing kept every character's width
+        if len(lowered) == len(text):
+            for end, length in automaton.iter(lowered, pos):
+                yield end - length + 1, end + 1
+            return
+    for hit in analysis_config.keyword_pattern.finditer(text, pos):
+        yield hit.span()
+
+def _header_path(paths: str) -> str:
+    """File name from the "<old> <new>" part of a diff --git header
+    
+    Handles a/ b/ prefixes, --no-prefix diffs and paths containing spaces;
+    renames resolve to the new path.
+    """
+    half = len(paths) // 2
+    if len(paths) % 2 and paths[half] == " ":
+        old, new = paths[:half], paths[half + 1:]
+        if old == new:
+            return new
+        if old.startswith("a/") and new.startswith("b/") and old[2:] == new[2:]:
+            return new[2:]
+    if " b/" in paths:
+        return paths.rpartition(" b/")[2] or paths
+    return paths.rpartition(" ")[2]
+
+def _file_ext(file_path: str) -> str:
+    """Lowercased suffix with pathlib semantics, without building a Path"""
+    name = file_path.rpartition("/")[2]
+    dot = name.rfind(".")
+    if 0 < dot < len(name) - 1:
+        return name[dot:].lower()
+    return ""
+
+def calculate_risk_score(files_changed: List[str], notable_issues: List[Issue]) -> float:
     """Calculate risk score based on files and issues with configurable weights"""
-    config = get_config()
+    # Bind the weights table once instead of per file
+    file_type_weights = get_config().analysis.file_type_weights
     
     base_risk = 0.1
     
     # Risk from issues
-    issue_risk = 0.0
-    for issue in notable_issues:
-        risk_weight = issue.get('risk_weight', 0.2)
-        issue_risk += risk_weight
+    issue_risk = math.fsum(issue.risk_weight for issue in notable_issues)
     
-    # Risk from file types
+    # Risk from file types: mean weight, summed exactly so the score does not
+    # drift with the number of files (e.g. below llm_skip_threshold)
     file_risk = 0.0
-    for file_path in files_changed:
-        file_ext = Path(file_path).suffix.lower()
-        weight = config.analysis.file_type_weights.get(file_ext, 1.0)
-        file_risk += weight * 0.1
+    if files_changed:
+        weights = math.fsum(file_type_weights.get(_file_ext(file_path), 1.0) for file_path in files_changed)
+        file_risk = weights / len(files_changed) * 0.1
     
     # Combine risks
-    total_risk = base_risk + issue_risk + (file_risk / len(files_changed) if files_changed else 0)
+    total_risk = base_risk + issue_risk + file_risk
     
     # Cap at 1.0
     return min(total_risk, 1.0)
 
+def _llm_cache_key(prompt: str, config) -> str:
+    """Hash the prompt together with every setting that changes the LLM output"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(repr((
+        tuple(config.ollama.models),
+        config.ollama.temperature,
+        config.ollama.top_p,
+        config.ollama.max_tokens
+    )).encode())
+    digest.update(prompt.encode("utf-8", "surrogatepass"))
+    return digest.hexdigest()
+
+def _llm_cache_get(key: str, ttl_secs: Optional[float]) -> Optional[tuple[str, dict]]:
+    with _llm_cache_lock:
+        entry = _llm_cache.get(key)
+        if entry is not None and ttl_secs is not None and time.monotonic() - entry[2] > ttl_secs:
+            # Expired entries are evicted on access
+            del _llm_cache[key]
+            entry = None
+        if entry is None:
+            _llm_cache_stats["misses"] += 1
+        else:
+            _llm_cache.move_to_end(key)
+            _llm_cache_stats["hits"] += 1
+        logger.debug(f"LLM cache {'hit' if entry else 'miss'} "
+                     f"(hits={_llm_cache_stats['hits']}, misses={_llm_cache_stats['misses']})")
+        return entry[:2] if entry else None
+
+def _llm_cache_put(key: str, summary: str, metadata: dict, max_entries: int):
+    if max_entries <= 0:
+        return
+    with _llm_cache_lock:
+        _llm_cache[key] = (summary, dict(metadata), time.monotonic())
+        _llm_cache.move_to_end(key)
+        while len(_llm_cache) > max_entries:
+            _llm_cache.popitem(last=False)
+
+def _breaker_allows(model: str, config) -> bool:
+    """False while the model's circuit is open; lets one probe through after cooldown"""
+    with _breaker_lock:
+        failures, opened_at = _breaker.get(model, (0, 0.0))
+        if failures < config.ollama.breaker_threshold:
+            return True
+        if time.monotonic() - opened_at < config.ollama.breaker_cooldown:
+            return False
+        # Half-open: restamp so concurrent callers keep skipping until the probe finishes
+        _breaker[model] = (failures, time.monotonic())
+        logger.info(f"Circuit half-open for model {model}, probing")
+        return True
+
+def _breaker_record(model: str, config, success: bool):
+    with _breaker_lock:
+        if success:
+            failures, _ = _breaker.pop(model, (0, 0.0))
+            if failures >= config.ollama.breaker_threshold:
+                logger.info(f"Circuit closed for model {model}")
+            return
+        failures = _breaker.get(model, (0, 0.0))[0] + 1
+        _breaker[model] = (failures, time.monotonic())
+        if failures == config.ollama.breaker_threshold:
+            logger.warning(f"Circuit opened for model {model} after {failures} connection failures")
+
+def _read_llm_stream(response, deadline: float) -> str:
+    """Collect a streamed Ollama completion, failing fast on mid-stream errors"""
+    parts = []
+    try:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = orjson.loads(line)
+            if "error" in chunk:
+                raise RuntimeError(f"Ollama stream error: {chunk['error']}")
+            parts.append(chunk.get("response", ""))
+            if chunk.get("done"):
+                break
+            # The HTTP timeout only bounds the gap between chunks
+            if time.monotonic() > deadline:
+                raise requests.exceptions.Timeout("LLM generation exceeded timeout")
+    except requests.exceptions.ConnectionError as e:
+        # requests reports a read timeout mid-stream as ConnectionError; the
+        # server already answered, so it must not count toward the breaker
+        raise requests.exceptions.Timeout(f"LLM stream stalled: {e}") from e
+    return "".join(parts)
+
+def _diff_excerpt(pr_diff_text: str, max_chars: int) -> str:
+    """Changed lines and headers of the diff, capped at max_chars"""
+    excerpt = "\n".join(m.group(0) for m in _EXCERPT_LINE_RE.finditer(pr_diff_text))
+    if len(excerpt) > max_chars:
+        excerpt = excerpt[:max_chars] + "\n...[truncated]"
+    return excerpt
+
+def _post_with_retry(url: str, payload: bytes, timeout: float, retries: int, deadline: float):
+    """POST a streaming request, retrying transient HTTP statuses with exponential backoff
+    
+    Connection errors and non-retryable statuses return immediately so the
+    caller can move on to the next model.
+    """
+    for attempt in range(retries + 1):
+        response = _SESSION.post(url,
+            data=payload,
+            headers={"Content-Type": "application/json"},
+            timeout=timeout,
+            stream=True
+        )
+        if response.status_code not in _RETRYABLE_STATUS:
+            return response
+        
+        delay = 0.5 * 2 ** attempt
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            delay = float(retry_after)
+        if attempt == retries or time.monotonic() + delay > deadline:
+            return response
+        
+        logger.info(f"Ollama returned status {response.status_code}, retrying in {delay}s")
+        response.close()
+        time.sleep(delay)
+
+def _call_ollama(model: str, prompt: str, ollama_config) -> str:
+    """Stream one completion from Ollama and return the cleaned review text"""
+    deadline = time.monotonic() + ollama_config.timeout
+    payload = orjson.dumps({
+        "model": model,
+        "prompt": prompt,
+        "stream": True,
+        "keep_alive": ollama_config.keep_alive,
+        "options": {
+            "temperature": ollama_config.temperature,
+            "top_p": ollama_config.top_p,
+            "num_predict": ollama_config.max_tokens,
+            "stop": ["Note:", "Overall,", "\n\nNote"]
+        }
+    })
+    response = _post_with_retry(f'{ollama_config.base_url}/api/generate',
+        payload, ollama_config.timeout, ollama_config.retries, deadline
+    )
+    
+    with response:
+        if response.status_code != 200:
+            raise requests.exceptions.HTTPError(f"HTTP {response.status_code}", response=response)
+        result = _read_llm_stream(response, deadline).strip()
+        return clean_ai_response(result)
+
+def _note_llm_failure(model: str, error: Exception, config, metadata: dict):
+    """Log a failed model attempt and record it in the LLM metadata"""
+    if isinstance(error, requests.exceptions.ConnectionError):
+        logger.warning(f"Could not connect to Ollama for model {model}")
+        metadata["llm_error"] = "Connection failed"
+        _breaker_record(model, config, success=False)
+    elif isinstance(error, requests.exceptions.Timeout):
+        logger.warning(f"Timeout waiting for model {model}")
+        metadata["llm_error"] = "Timeout"
+    elif isinstance(error, requests.exceptions.HTTPError):
+        logger.warning(f"Model {model} returned status {error.response.status_code}")
+        metadata["llm_error"] = str(error)
+    else:
+        logger.warning(f"Model {model} failed with error: {error}")
+        metadata["llm_error"] = str(error)
+
+def _race_models(prompt: str, config, metadata: dict) -> Optional[tuple[str, str]]:
+    """Query all available models at once and return (model, review) from the first success"""
+    models = [model for model in config.ollama.models if _breaker_allows(model, config)]
+    if not models:
+        metadata["llm_error"] = "Circuit open"
+        return None
+    
+    logger.info(f"Racing LLM models: {', '.join(models)}")
+    # As in the sequential path, the last model tried is reported if none succeeds
+    metadata["llm_used"] = models[-1]
+    executor = ThreadPoolExecutor(max_workers=len(models), thread_name_prefix="ollama_race")
+    futures = {executor.submit(_call_ollama, model, prompt, config.ollama): model for model in models}
+    try:
+        for future in as_completed(futures, timeout=config.ollama.timeout):
+            model = futures[future]
+            try:
+                return model, future.result()
+            except Exception as e:
+                _note_llm_failure(model, e, config, metadata)
+    except FuturesTimeoutError:
+        logger.warning("Timeout waiting for any model")
+        metadata["llm_error"] = "Timeout"
+    finally:
+        # Losers are abandoned; their streams stop at their own deadline
+        executor.shutdown(wait=False, cancel_futures=True)
+    return None
+
 def get_llm_summary(pr_diff_text: str, analysis_data: dict) -> tuple[str, dict]:
     """Generate human-readable summary using Ollama with error handling"""
     config = get_config()
+    ollama_config = config.ollama
     
     metadata = {
         "llm_used": None,
         "llm_success": False,
         "llm_error": None,
-        "response_time": None
+        "response_time": None,
+        "cache_hit": False
     }
     
     # Create context about the changes
     issues_context = ""
     if analysis_data['notable_issues']:
-        issues_list = [issue['issue'] for issue in analysis_data['notable_issues']]
+        issues_list = [issue.issue for issue in analysis_data['notable_issues']]
         issues_context = f"\nIssues detected: {', '.join(issues_list)}"
     
+    # Context lines add tokens (and latency) without helping the review
+    diff_excerpt = _diff_excerpt(pr_diff_text, ollama_config.prompt_diff_chars)
+    metadata["diff_chars"] = len(pr_diff_text)
+    metadata["prompt_diff_chars"] = len(diff_excerpt)
+    
     risk_level = "high" if analysis_data['risk_score'] > 0.7 else "medium" if analysis_data['risk_score'] > 0.3 else "low"
     
-    prompt = f"""You are a senior software engineer conducting a code review. Analyze this PR and provide a professional assessment.
-
-Files Changed: {', '.join(analysis_data['files_changed'])}
-Risk Level: {risk_level}{issues_context}
-
-PR Diff:
-{pr_diff_text}
-
-Provide a concise professional code review (2-3 sentences) covering:
-1. What functionality was added/changed
-2. Any security, performance, or code quality concerns
-3. Overall recommendation
-
-Be direct and actionable. Focus on what matters to developers."""
+    prompt = "".join([
+        _PROMPT_HEADER,
+        ", ".join(analysis_data['files_changed']),
+        "\nRisk Level: ", risk_level, issues_context,
+        "\n\nPR Diff:\n", diff_excerpt,
+        _PROMPT_FOOTER
+    ])
+    
+    start_time = time.monotonic()
     
-    start_time = datetime.now()
+    # Identical diffs (CI re-runs, retries) produce identical prompts
+    cache_key = _llm_cache_key(prompt, config)
+    cached = _llm_cache_get(cache_key, config.cache.ttl_secs)
+    if cached:
+        cached_summary, cached_metadata = cached
+        metadata.update(cached_metadata)
+        metadata["cache_hit"] = True
+        metadata["response_time"] = time.monotonic() - start_time
+        logger.info(f"Using cached LLM response from {metadata['llm_used']}")
+        return cached_summary, metadata
     
-    for model in config.ollama.models:
-        try:
+    if ollama_config.race_models:
+        winner = _race_models(prompt, config, metadata)
+    else:
+        winner = None
+        for model in ollama_config.models:
+            if not _breaker_allows(model, config):
+                logger.info(f"Skipping model {model}: circuit open")
+                metadata["llm_error"] = "Circuit open"
+                continue
+            
             logger.info(f"Attempting LLM analysis with model: {model}")
             metadata["llm_used"] = model
-            
-            response = requests.post(f'{config.ollama.base_url}/api/generate',
-                json={
-                    "model": model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": config.ollama.temperature,
-                        "top_p": config.ollama.top_p,
-                        "num_predict": config.ollama.max_tokens,
-                        "stop": ["Note:", "Overall,", "\n\nNote"]
-                    }
-                },
-                timeout=config.ollama.timeout
-            )
-            
-            if response.status_code == 200:
-                result = response.json()['response'].strip()
-                cleaned_result = clean_ai_response(result)
-                
-                metadata["llm_success"] = True
-                metadata["response_time"] = (datetime.now() - start_time).total_seconds()
-                
-                logger.info(f"Successfully got LLM response from {model}")
-                return cleaned_result, metadata
-            else:
-                logger.warning(f"Model {model} returned status {response.status_code}")
-                metadata["llm_error"] = f"HTTP {response.status_code}"
-                
-        except requests.exceptions.ConnectionError:
-            logger.warning(f"Could not connect to Ollama for model {model}")
-            metadata["llm_error"] = "Connection failed"
-            continue
-        except requests.exceptions.Timeout:
-            logger.warning(f"Timeout waiting for model {model}")
-            metadata["llm_error"] = "Timeout"
-            continue
-        except Exception as e:
-            logger.warning(f"Model {model} failed with error: {e}")
-            metadata["llm_error"] = str(e)
-            continue
+            try:
+                winner = model, _call_ollama(model, prompt, ollama_config)
+                break
+            except Exception as e:
+                _note_llm_failure(model, e, config, metadata)
+    
+    if winner:
+        model, cleaned_result = winner
+        metadata["llm_used"] = model
+        metadata["llm_success"] = True
+        metadata["response_time"] = time.monotonic() - start_time
+        
+        logger.info(f"Successfully got LLM response from {model}")
+        _breaker_record(model, config, success=True)
+        _llm_cache_put(cache_key, cleaned_result, metadata, config.cache.max_entries)
+        return cleaned_result, metadata
     
     # All models failed - return intelligent fallback
     logger.info("All LLM models failed, using intelligent fallback")
-    metadata["response_time"] = (datetime.now() - start_time).total_seconds()
+    metadata["response_time"] = time.monotonic() - start_time
     
     fallback_summary = generate_intelligent_fallback(analysis_data)
     return fallback_summary, metadata
 
+def close_session():
+    """Close pooled Ollama connections (for shutdown hooks)"""
+    _SESSION.close()
+
+def warm_up_llm() -> bool:
+    """Ask Ollama to load the primary model so the first review skips the cold start"""
+    config = get_config()
+    model = config.ollama.models[0] if config.ollama.models else None
+    if not model:
+        return False
+    
+    try:
+        # An empty prompt makes Ollama load the model without generating
+        response = _SESSION.post(f'{config.ollama.base_url}/api/generate',
+            json={"model": model, "prompt": "", "stream": False, "keep_alive": config.ollama.keep_alive},
+            timeout=config.ollama.timeout
+        )
+        if response.status_code == 200:
+            logger.info(f"Warmed up LLM model: {model}")
+            return True
+        logger.warning(f"Warm-up of model {model} returned status {response.status_code}")
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Could not warm up model {model}: {e}")
+    return False
+
 def generate_intelligent_fallback(analysis_data: dict) -> str:
     """Generate intelligent summary when LLM fails"""
     files = analysis_data['files_changed']
@@ -173,7 +498,7 @@ def generate_intelligent_fallback(analysis_data: dict) -> str:
     summary = f"This PR modifies {len(files)} file(s)"
     
     if issues:
-        high_risk_issues = [i for i in issues if i.get('risk_weight', 0) > 0.5]
+        high_risk_issues = [i for i in issues if i.risk_weight > 0.5]
         if high_risk_issues:
             summary += f" and contains {len(high_risk_issues)} high-risk issue(s)"
         else:
@@ -190,53 +515,48 @@ def generate_intelligent_fallback(analysis_data: dict) -> str:
 
 def clean_ai_response(response: str) -> str:
     """Remove common AI meta-commentary"""
-    prefixes_to_remove = [
-        "Here is a concise professional code review:",
-        "Here's a concise professional code review:",
-        "Here is a professional assessment:",
-        "Here's my code review:",
-        "Based on the PR diff:",
-        "Looking at this PR:"
-    ]
-    
-    for prefix in prefixes_to_remove:
-        if response.startswith(prefix):
-            response = response[len(prefix):].strip()
+    response = _AI_PREFIX_RE.sub("", response, count=1)
     
     # Remove meta-commentary endings
-    endings_to_remove = [
-        r"Note:.*$",
-        r"Overall.*recommendation.*$",
-        r"I've kept.*concise.*$"
-    ]
-    
-    for pattern in endings_to_remove:
-        response = re.sub(pattern, "", response, flags=re.IGNORECASE | re.MULTILINE).strip()
+    response = _AI_ENDING_RE.sub("", response).strip()
     
     # Clean up formatting
-    response = re.sub(r'\s+', ' ', response)
-    response = re.sub(r'\.\s*\.', '.', response)
+    response = _WHITESPACE_RE.sub(' ', response)
+    response = _DOUBLE_DOT_RE.sub('.', response)
     
     if response and not response.endswith(('.', '!', '?')):
         response += '.'
     
     return response
 
-def analyze_pr(pr_diff_text: str) -> AnalyzePROutput:
-    """Enhanced PR analysis with configuration management"""
+def _discard_metadata(key: str, value):
+    """Metadata sink used when analyze_pr runs without metadata collection"""
+
+def analyze_pr(pr_diff_text: str, collect_metadata: bool = True) -> AnalyzePROutput:
+    """Enhanced PR analysis with configuration management
+    
+    With collect_metadata=False, analysis_metadata is returned empty and
+    none of its entries are built.
+    """
     config = get_config()
+    analysis_config = config.analysis
     
-    analysis_metadata = {
-        "timestamp": datetime.now().isoformat(),
-        "input_valid": False,
-        "parsing_success": False,
-        "llm_metadata": {},
-        "config_used": {
-            "models": config.ollama.models,
-            "max_diff_size": config.analysis.max_diff_size,
-            "risk_keywords_count": len(config.analysis.risk_keywords)
+    if collect_metadata:
+        analysis_metadata = {
+            "timestamp": datetime.now().isoformat(),
+            "input_valid": False,
+            "parsing_success": False,
+            "llm_metadata": {},
+            "config_used": {
+                "models": list(config.ollama.models),
+                "max_diff_size": analysis_config.max_diff_size,
+                "risk_keywords_count": len(analysis_config.risk_keywords)
+            }
         }
-    }
+        record = analysis_metadata.__setitem__
+    else:
+        analysis_metadata = {}
+        record = _discard_metadata
     
     try:
         # Step 1: Validate input
@@ -245,57 +565,68 @@ def analyze_pr(pr_diff_text: str) -> AnalyzePROutput:
         
         if not is_valid:
             logger.error(f"Input validation failed: {validation_msg}")
-            analysis_metadata["validation_error"] = validation_msg
+            record("validation_error", validation_msg)
             
             return AnalyzePROutput(
                 summary="Analysis failed due to invalid input",
                 risk_score=0.0,
                 files_changed=[],
-                notable_issues=[{"file": "input", "issue": validation_msg}],
+                notable_issues=[Issue(file="input", issue=validation_msg)],
                 suggested_tests=["Fix input format"],
                 suggested_labels=["invalid-input"],
                 human_readable_review=f"Cannot analyze PR: {validation_msg}",
                 analysis_metadata=analysis_metadata
             )
         
-        analysis_metadata["input_valid"] = True
+        record("input_valid", True)
         
         # Step 2: Parse diff with enhanced analysis
-        files_changed = []
         notable_issues = []
         
-        lines = pr_diff_text.split("\n")
-        current_file = None
+        # Locate file headers, then sweep the keyword pattern over the whole
+        # diff in one pass; Python only visits headers and keyword hits
+        keywords = analysis_config.risk_keywords
         
-        for line in lines:
-            try:
-                if line.startswith("diff --git"):
-                    parts = line.split(" ")
-                    if len(parts) >= 3:
-                        current_file = parts[2][2:]  # remove 'b/' prefix
-                        if current_file not in files_changed:
-                            files_changed.append(current_file)
-                elif line.startswith("+") and current_file:
-                    # Check for configured risk keywords
-                    line_lower = line.lower()
-                    for keyword, weight in config.analysis.risk_keywords.items():
-                        if keyword.lower() in line_lower:
-                            notable_issues.append({
-                                "file": current_file, 
-                                "issue": f"Contains {keyword} in added lines",
-                                "line_preview": line.strip()[:100],
-                                "risk_weight": weight,
-                                "keyword": keyword
-                            })
-                            break  # Only report first match per line
-                            
-            except Exception as line_error:
-                logger.warning(f"Error processing line: {line_error}")
-                continue
+        headers = [(m.start(), _header_path(m.group(1))) for m in _DIFF_HEADER_RE.finditer(pr_diff_text)]
+        # dict keeps first-seen order with O(1) de-duplication
+        files_changed = list(dict.fromkeys(file_path for _, file_path in headers))
+        
+        if headers and keywords:
+            header_index = 0
+            last_line_start = -1
+            
+            for hit_start, hit_end in _keyword_hits(pr_diff_text, headers[0][0], analysis_config):
+                line_start = pr_diff_text.rfind("\n", 0, hit_start) + 1
+                if line_start == last_line_start:
+                    continue  # Only report first match per line
+                last_line_start = line_start
+                if not pr_diff_text.startswith("+", line_start):
+                    continue  # Only added lines count
+                
+                line_end = pr_diff_text.find("\n", hit_end)
+                line = pr_diff_text[line_start:line_end if line_end >= 0 else None]
+                
+                # Check for configured risk keywords
+                first = _first_keyword(line, keywords)
+                if not first:
+                    continue
+                
+                # Hits arrive in order, so the owning header only moves forward
+                while header_index + 1 < len(headers) and headers[header_index + 1][0] < line_start:
+                    header_index += 1
+                
+                keyword, weight = first
+                notable_issues.append(Issue(
+                    file=headers[header_index][1],
+                    issue=f"Contains {keyword} in added lines",
+                    line_preview=line.strip()[:100],
+                    risk_weight=weight,
+                    keyword=keyword
+                ))
         
-        analysis_metadata["parsing_success"] = True
-        analysis_metadata["files_found"] = len(files_changed)
-        analysis_metadata["issues_found"] = len(notable_issues)
+        record("parsing_success", True)
+        record("files_found", len(files_changed))
+        record("issues_found", len(notable_issues))
         
         # Step 3: Calculate risk using config-based scoring
         summary = f"PR changes in {len(files_changed)} file(s)."
@@ -320,8 +651,21 @@ def analyze_pr(pr_diff_text: str) -> AnalyzePROutput:
             'summary': summary
         }
         
-        human_readable_review, llm_metadata = get_llm_summary(pr_diff_text, analysis_data)
-        analysis_metadata["llm_metadata"] = llm_metadata
+        # Use the deterministic summary when the LLM is disabled or the PR is
+        # trivial enough that a model adds nothing
+        skip_reason = None
+        if config.summarizer == "none":
+            skip_reason = "summarizer disabled"
+        elif risk_score < analysis_config.llm_skip_threshold and not notable_issues:
+            skip_reason = "low risk"
+        
+        if skip_reason:
+            logger.info(f"Skipping LLM review: {skip_reason}")
+            human_readable_review = generate_intelligent_fallback(analysis_data)
+            llm_metadata = {"llm_used": None, "llm_success": False, "skipped": True, "skip_reason": skip_reason}
+        else:
+            human_readable_review, llm_metadata = get_llm_summary(pr_diff_text, analysis_data)
+        record("llm_metadata", llm_metadata)
         
         logger.info(f"PR analysis completed successfully. Risk score: {risk_score}")
         
@@ -338,13 +682,13 @@ def analyze_pr(pr_diff_text: str) -> AnalyzePROutput:
         
     except Exception as e:
         logger.error(f"Unexpected error in PR analysis: {e}")
-        analysis_metadata["unexpected_error"] = str(e)
+        record("unexpected_error", str(e))
         
         return AnalyzePROutput(
             summary="Analysis encountered an unexpected error",
             risk_score=0.5,
             files_changed=["error"],
-            notable_issues=[{"file": "system", "issue": f"Analysis error: {str(e)}"}],
+            notable_issues=[Issue(file="system", issue=f"Analysis error: {str(e)}")],
             suggested_tests=["Manual review required"],
             suggested_labels=["analysis-failed"],
             human_readable_review=f"PR analysis failed due to system error. Manual review recommended.",
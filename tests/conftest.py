@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Mirror the server's import layout: app/ modules import each other as
+# top-level modules ("from config import get_config")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "app")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
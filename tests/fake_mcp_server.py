@@ -0,0 +1,22 @@
+"""Minimal MCP STDIO server for agent tests
+
+Sends a notification before each tool result and exits when asked to
+analyze the diff "crash".
+"""
+
+import json
+import os
+import sys
+
+for line in sys.stdin:
+    message = json.loads(line)
+    if "id" not in message:
+        continue
+    result = {}
+    if message["method"] == "tools/call":
+        if message["params"]["arguments"]["pr_diff_text"] == "crash":
+            sys.exit(1)
+        print(json.dumps({"jsonrpc": "2.0", "method": "notifications/message",
+                          "params": {"level": "info", "data": "analyzing"}}))
+        result = {"content": [{"type": "text", "text": json.dumps({"pid": os.getpid()})}]}
+    print(json.dumps({"jsonrpc": "2.0", "id": message["id"], "result": result}), flush=True)
@@ -0,0 +1,66 @@
+"""MCP agent transports"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app import agent
+from conftest import ROOT
+
+# Low risk and keyword-free, so the analysis never reaches the LLM
+DOCS_DIFF = "diff --git a/README.md b/README.md\n+More docs\n"
+
+
+def test_inproc_transport_works_when_imported_as_package():
+    # A clean interpreter from the repo root: only the package layout is importable
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONPATH"}
+    env["MCP_TRANSPORT"] = "inproc"
+    code = (
+        "from app.agent import call_analyze_pr_tool\n"
+        f"print(call_analyze_pr_tool({DOCS_DIFF!r})['result']['files_changed'])\n"
+    )
+
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip().splitlines()[-1] == "['README.md']"
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    monkeypatch.setattr(agent, "_SERVER_SCRIPT", os.path.join(ROOT, "tests", "fake_mcp_server.py"))
+    registered = []
+    monkeypatch.setattr(agent.atexit, "register", registered.append)
+    yield registered
+    agent._reset_client()
+
+
+def test_stdio_reuses_one_server_process(fake_server):
+    first = agent.call_analyze_pr_tool_stdio(DOCS_DIFF)
+    second = agent.call_analyze_pr_tool_stdio(DOCS_DIFF)
+
+    assert first == second
+    assert agent._client.calls == 2
+
+
+def test_stdio_skips_server_notifications(fake_server):
+    result = agent.call_analyze_pr_tool_stdio(DOCS_DIFF)
+
+    assert result == {"result": {"pid": agent._client.proc.pid}}
+
+
+def test_stdio_restarts_server_after_failure(fake_server):
+    pid = agent.call_analyze_pr_tool_stdio(DOCS_DIFF)["result"]["pid"]
+    dead = agent._client
+
+    with pytest.raises(RuntimeError):
+        agent.call_analyze_pr_tool_stdio("crash")
+    assert agent._client is None
+    assert dead.proc.returncode is not None
+
+    assert agent.call_analyze_pr_tool_stdio(DOCS_DIFF)["result"]["pid"] != pid
+    # Restarts rely on the module-level exit hook instead of registering more
+    assert fake_server == []
@@ -0,0 +1,27 @@
+"""Configuration dataclasses"""
+
+from functools import lru_cache
+
+from config import AnalysisConfig, PRAnalyzerConfig, get_config
+
+
+def test_configs_are_hashable():
+    assert hash(get_config()) == hash(get_config())
+    assert hash(PRAnalyzerConfig.default()) == hash(PRAnalyzerConfig.default())
+    assert hash(AnalysisConfig()) == hash(AnalysisConfig())
+
+
+def test_equal_configs_share_cache_entries():
+    calls = []
+
+    @lru_cache(maxsize=None)
+    def keyword_count(config):
+        calls.append(config)
+        return len(config.analysis.risk_keywords)
+
+    keyword_count(PRAnalyzerConfig.default())
+    keyword_count(PRAnalyzerConfig.default())
+    custom = PRAnalyzerConfig(ollama=get_config().ollama, analysis=AnalysisConfig(risk_keywords={"TODO": 0.2}))
+
+    assert keyword_count(custom) == 1
+    assert len(calls) == 2
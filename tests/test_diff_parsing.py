@@ -0,0 +1,164 @@
+"""Diff parsing in analyze_pr, checked against a plain line-by-line parser"""
+
+import random
+
+import pytest
+
+import config
+from app.tools import analyse_pr
+from config import AnalysisConfig, OllamaConfig, PRAnalyzerConfig
+
+HEADERS = [
+    ("diff --git a/app.py b/app.py", "app.py"),
+    ("diff --git a/scripts/run.sh b/scripts/run.sh", "scripts/run.sh"),
+    ("diff --git app.py app.py", "app.py"),
+    ("diff --git a/docs/my notes.md b/docs/my notes.md", "docs/my notes.md"),
+    ("diff --git my notes.txt my notes.txt", "my notes.txt"),
+    ("diff --git a/old name.py b/new name.py", "new name.py"),
+]
+
+BODY_LINES = [
+    "+", "-", " ", "+++ b/app.py", "--- a/app.py", "@@ -1,3 +1,4 @@",
+    "x = 1", "TODO", "token", "Password", "eval(data)", "subprocess shell=True",
+    "api_key", "FIXME", "os.system('ls')", "\t",
+]
+
+
+def reference_parse(text, keywords):
+    """The original split-and-loop parser, with _header_path for file names"""
+    files, issues, current = [], [], None
+    for line in text.split("\n"):
+        if line.startswith("diff --git "):
+            paths = line[len("diff --git "):].rstrip()
+            if paths:
+                current = analyse_pr._header_path(paths)
+                if current not in files:
+                    files.append(current)
+        elif line.startswith("+") and current is not None:
+            for keyword, weight in keywords.items():
+                if keyword.lower() in line.lower():
+                    issues.append(analyse_pr.Issue(
+                        file=current,
+                        issue=f"Contains {keyword} in added lines",
+                        line_preview=line.strip()[:100],
+                        risk_weight=weight,
+                        keyword=keyword
+                    ))
+                    break
+    return files, issues
+
+
+def random_diff(rng):
+    lines = []
+    for _ in range(rng.randint(1, 15)):
+        if rng.random() < 0.2:
+            lines.append(rng.choice(HEADERS)[0] + rng.choice(["", "", "\r"]))
+        else:
+            lines.append(rng.choice(["+", "+", "-", " ", ""]) + rng.choice(BODY_LINES)
+                         + rng.choice(["", "", " TODO", " token x", "\r"]))
+    return "\n".join(lines)
+
+
+@pytest.fixture
+def cfg(monkeypatch):
+    cfg = PRAnalyzerConfig(ollama=OllamaConfig(), analysis=AnalysisConfig(), summarizer="none")
+    monkeypatch.setattr(analyse_pr, "get_config", lambda: cfg)
+    return cfg
+
+
+@pytest.fixture
+def automaton_cfg(monkeypatch):
+    pytest.importorskip("ahocorasick")
+    monkeypatch.setattr(config, "_AUTOMATON_MIN_KEYWORDS", 1)
+    cfg = PRAnalyzerConfig(ollama=OllamaConfig(), analysis=AnalysisConfig(), summarizer="none")
+    assert cfg.analysis.keyword_automaton is not None
+    monkeypatch.setattr(analyse_pr, "get_config", lambda: cfg)
+    return cfg
+
+
+@pytest.mark.parametrize("paths, expected", [
+    ("a/app.py b/app.py", "app.py"),
+    ("app.py app.py", "app.py"),
+    ("a/docs/my notes.md b/docs/my notes.md", "docs/my notes.md"),
+    ("a/old.py b/new.py", "new.py"),
+    ("old.py new.py", "new.py"),
+    ("a/a/x.py b/a/x.py", "a/x.py"),
+])
+def test_header_path(paths, expected):
+    assert analyse_pr._header_path(paths) == expected
+
+
+def test_no_prefix_header(cfg):
+    result = analyse_pr.analyze_pr("diff --git app.py app.py\n+eval(x)\n")
+    assert result.files_changed == ["app.py"]
+    assert [(i.file, i.keyword) for i in result.notable_issues] == [("app.py", "eval(")]
+    assert "high-risk" in result.suggested_labels
+
+
+def test_path_with_spaces_is_its_own_file(cfg):
+    diff = ("diff --git a/app.py b/app.py\n+x = 1\n"
+            "diff --git a/docs/my notes.md b/docs/my notes.md\n+password: hunter2\n")
+    result = analyse_pr.analyze_pr(diff)
+    assert result.files_changed == ["app.py", "docs/my notes.md"]
+    assert [i.file for i in result.notable_issues] == ["docs/my notes.md"]
+
+
+def test_crlf_input(cfg):
+    result = analyse_pr.analyze_pr("diff --git a/x.py b/x.py\r\n+token = 1\r\n")
+    assert result.files_changed == ["x.py"]
+    assert result.notable_issues[0].line_preview == "+token = 1"
+
+
+def test_plus_plus_plus_lines_count_as_added(cfg):
+    result = analyse_pr.analyze_pr("diff --git a/x.py b/x.py\n+++ b/token.py\n")
+    assert [i.keyword for i in result.notable_issues] == ["token"]
+
+
+def test_hits_before_first_header_are_ignored(cfg):
+    result = analyse_pr.analyze_pr("+eval(x)\ndiff --git a/x.py b/x.py\n+x = 1\n")
+    assert result.files_changed == ["x.py"]
+    assert result.notable_issues == []
+
+
+@pytest.mark.parametrize("fixture", ["cfg", "automaton_cfg"])
+def test_matches_line_by_line_parser(fixture, request):
+    cfg = request.getfixturevalue(fixture)
+    rng = random.Random(7)
+    for _ in range(2000):
+        diff = random_diff(rng)
+        if "diff --git" not in diff:
+            continue
+        result = analyse_pr.analyze_pr(diff, collect_metadata=False)
+        assert (result.files_changed, result.notable_issues) == \
+            reference_parse(diff, cfg.analysis.risk_keywords), repr(diff)
+
+
+def test_no_prefix_eval_is_not_skipped_as_low_risk(monkeypatch):
+    cfg = PRAnalyzerConfig(ollama=OllamaConfig(), analysis=AnalysisConfig())
+    monkeypatch.setattr(analyse_pr, "get_config", lambda: cfg)
+    calls = []
+    monkeypatch.setattr(analyse_pr, "get_llm_summary",
+                        lambda diff, data: calls.append(data) or ("review", {"llm_success": True}))
+    
+    result = analyse_pr.analyze_pr("diff --git app.py app.py\n+eval(x)\n")
+    
+    assert len(calls) == 1
+    assert "skipped" not in result.analysis_metadata["llm_metadata"]
+    assert "Low risk" not in result.human_readable_review
+    assert result.risk_score >= cfg.analysis.llm_skip_threshold
+
+
+@pytest.mark.parametrize("file_count", [1, 2, 47, 48, 100, 399])
+def test_code_only_pr_score_does_not_drift_with_file_count(monkeypatch, file_count):
+    cfg = PRAnalyzerConfig(ollama=OllamaConfig(), analysis=AnalysisConfig())
+    monkeypatch.setattr(analyse_pr, "get_config", lambda: cfg)
+    calls = []
+    monkeypatch.setattr(analyse_pr, "get_llm_summary",
+                        lambda diff, data: calls.append(data) or ("review", {"llm_success": True}))
+    diff = "".join(f"diff --git a/m{i}.py b/m{i}.py\n+x = {i}\n" for i in range(file_count))
+    
+    result = analyse_pr.analyze_pr(diff)
+    
+    assert result.risk_score == 0.2
+    assert len(calls) == 1
+    assert "skipped" not in result.analysis_metadata["llm_metadata"]
@@ -0,0 +1,394 @@
+"""Ollama client behaviour in analyse_pr, with the HTTP session and clock faked"""
+
+import threading
+
+import orjson
+import pytest
+import requests
+
+from app.tools import analyse_pr
+from config import AnalysisConfig, CacheConfig, OllamaConfig, PRAnalyzerConfig
+
+DIFF = "diff --git a/x.py b/x.py\n+x = 1\n"
+ANALYSIS_DATA = {"files_changed": ["x.py"], "risk_score": 0.5, "notable_issues": [], "summary": ""}
+
+
+class FakeClock:
+    """Stands in for the time module; sleep advances monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.sleeps.append(secs)
+        self.now += secs
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, text="Looks fine.", headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+        self._lines = [orjson.dumps({"response": text, "done": True})]
+
+    def iter_lines(self):
+        return iter(self._lines)
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakePost:
+    """Replays scripted outcomes: responses are returned, exceptions raised"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    monkeypatch.setattr(analyse_pr, "_breaker", {})
+    monkeypatch.setattr(analyse_pr, "_llm_cache", type(analyse_pr._llm_cache)())
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(analyse_pr, "time", clock)
+    return clock
+
+
+def use_config(monkeypatch, cache=None, **ollama):
+    ollama = {"models": ("m",), "retries": 0, **ollama}
+    cfg = PRAnalyzerConfig(
+        ollama=OllamaConfig(**ollama),
+        analysis=AnalysisConfig(),
+        cache=cache or CacheConfig(max_entries=0)
+    )
+    monkeypatch.setattr(analyse_pr, "get_config", lambda: cfg)
+    return cfg
+
+
+def use_post(monkeypatch, *outcomes):
+    post = FakePost(*outcomes)
+    monkeypatch.setattr(analyse_pr._SESSION, "post", post)
+    return post
+
+
+def summarize():
+    return analyse_pr.get_llm_summary(DIFF, ANALYSIS_DATA)
+
+
+def test_breaker_opens_after_threshold_connection_failures(monkeypatch, clock):
+    use_config(monkeypatch, breaker_threshold=2)
+    post = use_post(monkeypatch, requests.exceptions.ConnectionError())
+
+    summarize()
+    summarize()
+    assert post.calls == 2
+
+    _, metadata = summarize()
+    assert post.calls == 2
+    assert metadata["llm_error"] == "Circuit open"
+
+
+def test_breaker_stays_open_during_cooldown(monkeypatch, clock):
+    use_config(monkeypatch, breaker_threshold=1, breaker_cooldown=60.0)
+    post = use_post(monkeypatch, requests.exceptions.ConnectionError(), FakeResponse())
+
+    summarize()
+    clock.now += 59.0
+    _, metadata = summarize()
+
+    assert post.calls == 1
+    assert not metadata["llm_success"]
+
+
+def test_breaker_lets_one_probe_through_after_cooldown(monkeypatch, clock):
+    cfg = use_config(monkeypatch, breaker_threshold=1, breaker_cooldown=60.0)
+    post = use_post(monkeypatch, requests.exceptions.ConnectionError())
+
+    summarize()
+    clock.now += 61.0
+    assert analyse_pr._breaker_allows("m", cfg)
+    # Concurrent callers keep skipping while the probe is in flight
+    assert not analyse_pr._breaker_allows("m", cfg)
+
+    # A failed probe re-opens the circuit for another cooldown
+    analyse_pr._breaker_record("m", cfg, success=False)
+    clock.now += 30.0
+    summarize()
+    assert post.calls == 1
+
+
+def test_breaker_closes_on_success(monkeypatch, clock):
+    use_config(monkeypatch, breaker_threshold=2, breaker_cooldown=60.0)
+    post = use_post(monkeypatch, requests.exceptions.ConnectionError(),
+                    requests.exceptions.ConnectionError(), FakeResponse(),
+                    requests.exceptions.ConnectionError())
+
+    summarize()
+    summarize()
+    clock.now += 61.0
+    _, metadata = summarize()
+    assert metadata["llm_success"]
+    assert analyse_pr._breaker == {}
+
+    # The failure count starts over, so one failure does not re-open it
+    summarize()
+    summarize()
+    assert post.calls == 5
+
+
+@pytest.mark.parametrize("outcome", [
+    requests.exceptions.Timeout(),
+    FakeResponse(status_code=404),
+    FakeResponse(status_code=503),
+])
+def test_timeouts_and_http_errors_do_not_trip_breaker(monkeypatch, clock, outcome):
+    use_config(monkeypatch, breaker_threshold=1)
+    post = use_post(monkeypatch, outcome)
+
+    for _ in range(3):
+        summarize()
+
+    assert post.calls == 3
+    assert analyse_pr._breaker == {}
+
+
+class StallingResponse(FakeResponse):
+    """Sends one chunk, then times out the way requests reports it mid-stream"""
+
+    def iter_lines(self):
+        yield orjson.dumps({"response": "Adds", "done": False})
+        raise requests.exceptions.ConnectionError("Read timed out.")
+
+
+def test_mid_stream_stall_counts_as_timeout_not_connection_failure(monkeypatch, clock):
+    use_config(monkeypatch, breaker_threshold=1)
+    post = use_post(monkeypatch, StallingResponse())
+
+    for _ in range(3):
+        _, metadata = summarize()
+
+    assert post.calls == 3
+    assert metadata["llm_error"] == "Timeout"
+    assert analyse_pr._breaker == {}
+
+
+def post_with_retry(retries=2, deadline=2000.0):
+    return analyse_pr._post_with_retry("http://ollama/api/generate", b"{}", 20, retries, deadline)
+
+
+def test_retryable_statuses_back_off_exponentially(monkeypatch, clock):
+    failures = [FakeResponse(status_code=503), FakeResponse(status_code=502)]
+    post = use_post(monkeypatch, *failures, FakeResponse())
+
+    response = post_with_retry()
+
+    assert response.status_code == 200
+    assert post.calls == 3
+    assert clock.sleeps == [0.5, 1.0]
+    assert all(failure.closed for failure in failures)
+
+
+def test_retry_after_header_is_honoured(monkeypatch, clock):
+    use_post(monkeypatch, FakeResponse(status_code=429, headers={"Retry-After": "3"}), FakeResponse())
+
+    assert post_with_retry().status_code == 200
+    assert clock.sleeps == [3.0]
+
+
+def test_last_retryable_response_is_returned_when_retries_run_out(monkeypatch, clock):
+    post = use_post(monkeypatch, FakeResponse(status_code=503))
+
+    assert post_with_retry(retries=2).status_code == 503
+    assert post.calls == 3
+    assert clock.sleeps == [0.5, 1.0]
+
+
+def test_non_retryable_status_returns_immediately(monkeypatch, clock):
+    post = use_post(monkeypatch, FakeResponse(status_code=404), FakeResponse())
+
+    assert post_with_retry().status_code == 404
+    assert post.calls == 1
+    assert clock.sleeps == []
+
+
+def test_connection_error_is_not_retried(monkeypatch, clock):
+    post = use_post(monkeypatch, requests.exceptions.ConnectionError(), FakeResponse())
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        post_with_retry()
+    assert post.calls == 1
+
+
+def test_deadline_cuts_off_backoff(monkeypatch, clock):
+    post = use_post(monkeypatch, FakeResponse(status_code=503))
+
+    # 0.5s fits before the deadline, the following 1.0s backoff does not
+    response = post_with_retry(retries=5, deadline=clock.now + 0.7)
+
+    assert response.status_code == 503
+    assert post.calls == 2
+    assert clock.sleeps == [0.5]
+
+
+def test_negative_retries_are_rejected():
+    with pytest.raises(ValueError):
+        OllamaConfig(retries=-1)
+
+
+def test_cache_entries_expire_after_ttl(clock):
+    analyse_pr._llm_cache_put("k", "review", {}, max_entries=8)
+
+    clock.now += 10.0
+    assert analyse_pr._llm_cache_get("k", ttl_secs=10.0) == ("review", {})
+
+    clock.now += 0.5
+    assert analyse_pr._llm_cache_get("k", ttl_secs=10.0) is None
+    assert "k" not in analyse_pr._llm_cache
+
+
+def test_cache_evicts_least_recently_used(clock):
+    analyse_pr._llm_cache_put("a", "A", {}, max_entries=2)
+    analyse_pr._llm_cache_put("b", "B", {}, max_entries=2)
+    analyse_pr._llm_cache_get("a", ttl_secs=None)
+    analyse_pr._llm_cache_put("c", "C", {}, max_entries=2)
+
+    assert list(analyse_pr._llm_cache) == ["a", "c"]
+
+
+@pytest.mark.parametrize("max_entries", [0, -1])
+def test_cache_disabled_without_entries(clock, max_entries):
+    analyse_pr._llm_cache_put("k", "review", {}, max_entries=max_entries)
+
+    assert analyse_pr._llm_cache_get("k", ttl_secs=None) is None
+
+
+def test_cache_hit_reports_fresh_response_time(monkeypatch, clock):
+    use_config(monkeypatch, cache=CacheConfig(max_entries=8, ttl_secs=60.0))
+    response = FakeResponse(text="Adds x.")
+    post = use_post(monkeypatch, response)
+    # The model takes 5 seconds to answer
+    response.iter_lines = lambda: (clock.sleep(5.0), iter(response._lines))[1]
+
+    summary, metadata = summarize()
+    assert metadata["response_time"] == 5.0
+    assert not metadata["cache_hit"]
+
+    cached_summary, cached_metadata = summarize()
+    assert post.calls == 1
+    assert cached_summary == summary
+    assert cached_metadata["cache_hit"]
+    assert cached_metadata["llm_success"]
+    assert cached_metadata["llm_used"] == "m"
+    assert cached_metadata["response_time"] == 0.0
+
+
+class ModelPost:
+    """Answers by the model named in the request; an Event outcome blocks until set"""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.models = []
+
+    def __call__(self, url, data, **kwargs):
+        model = orjson.loads(data)["model"]
+        self.models.append(model)
+        outcome = self.outcomes[model]
+        if isinstance(outcome, threading.Event):
+            outcome.wait(5)
+            raise requests.exceptions.Timeout()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def stalled():
+    event = threading.Event()
+    yield event
+    # Release abandoned race workers
+    event.set()
+
+
+def use_race(monkeypatch, outcomes, **ollama):
+    use_config(monkeypatch, models=tuple(outcomes), race_models=True, **ollama)
+    post = ModelPost(outcomes)
+    monkeypatch.setattr(analyse_pr._SESSION, "post", post)
+    return post
+
+
+def test_race_returns_first_successful_model(monkeypatch, clock, stalled):
+    use_race(monkeypatch, {
+        "a": requests.exceptions.ConnectionError(),
+        "b": FakeResponse(text="From b."),
+        "c": stalled,
+    })
+
+    summary, metadata = summarize()
+
+    assert summary == "From b."
+    assert metadata["llm_success"]
+    assert metadata["llm_used"] == "b"
+
+
+def test_race_falls_back_when_every_model_fails(monkeypatch, clock):
+    use_race(monkeypatch, {
+        "a": requests.exceptions.ConnectionError(),
+        "b": FakeResponse(status_code=404),
+    })
+
+    summary, metadata = summarize()
+
+    assert summary == analyse_pr.generate_intelligent_fallback(ANALYSIS_DATA)
+    assert not metadata["llm_success"]
+    assert metadata["llm_used"] == "b"
+    assert metadata["llm_error"] is not None
+
+
+def test_race_times_out_waiting_for_any_model(monkeypatch, clock, stalled):
+    use_race(monkeypatch, {"a": stalled, "b": stalled}, timeout=0)
+
+    summary, metadata = summarize()
+
+    assert summary == analyse_pr.generate_intelligent_fallback(ANALYSIS_DATA)
+    assert metadata["llm_error"] == "Timeout"
+    assert metadata["llm_used"] == "b"
+
+
+def test_race_skips_models_with_open_circuit(monkeypatch, clock):
+    post = use_race(monkeypatch, {
+        "a": FakeResponse(text="From a."),
+        "b": FakeResponse(text="From b."),
+    })
+    analyse_pr._breaker["a"] = (3, clock.now)
+
+    summary, metadata = summarize()
+
+    assert post.models == ["b"]
+    assert summary == "From b."
+
+    analyse_pr._breaker["b"] = (3, clock.now)
+    _, metadata = summarize()
+    assert post.models == ["b"]
+    assert metadata["llm_error"] == "Circuit open"